@@ -0,0 +1,212 @@
+import collections
+import io
+import shutil
+import subprocess
+import threading
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+_FFMPEG = shutil.which("ffmpeg")
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+@pytest.fixture(scope="session")
+def sample_video(tmp_path_factory):
+    """A 20 s, 25 fps synthetic clip (skips the suite's ffmpeg tests when
+    no ffmpeg binary is on PATH)."""
+    if _FFMPEG is None:
+        pytest.skip("ffmpeg not available")
+    path = tmp_path_factory.mktemp("video") / "sample.mp4"
+    subprocess.check_call([
+        _FFMPEG, "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", "testsrc=duration=20:size=160x120:rate=25",
+        "-pix_fmt", "yuv420p", str(path),
+    ])
+    return path
+
+def _zip_names(response):
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/zip"
+    zf = zipfile.ZipFile(io.BytesIO(response.content))
+    assert zf.testzip() is None
+    return zf.namelist()
+
+def test_health(client):
+    assert client.get("/health").json() == {"ok": True}
+
+@pytest.mark.parametrize("raw,expected", [
+    ("my clip.zip", "my_clip.zip"),
+    ("weird///name", "weird_name.zip"),        # run of bad chars -> one _
+    ("my__file.zip", "my__file.zip"),          # literal __ passes through
+    ("a!_!b", "a___b.zip"),                    # _ between two replacements
+    ("snapshots.ZIP", "snapshots.ZIP"),
+    ("", "frames.zip"),
+    (None, "frames.zip"),
+])
+def test_safe_zip_name(raw, expected):
+    assert main._safe_zip_name(raw) == expected
+
+def test_frames_base_requires_shm_headroom(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "_SHM_MIN_FREE_BYTES", 1 << 60)
+    assert main._frames_base(str(tmp_path)) == str(tmp_path)
+    monkeypatch.setattr(main, "_SHM_MIN_FREE_BYTES", 0)
+    if main.os.path.isdir("/dev/shm"):
+        assert main._frames_base(str(tmp_path)) == "/dev/shm"
+
+def test_streamed_frames_are_pruned(tmp_path):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    for i in range(5):
+        (frames / f"frame_{i:06d}.jpg").write_bytes(b"x" * 64)
+    out = io.BytesIO()
+    main._produce_zip([["true"]], str(frames), out, main.threading.Event(), False)
+    names = zipfile.ZipFile(io.BytesIO(out.getvalue())).namelist()
+    assert len(names) == 5
+    # every archived frame was deleted from the workspace
+    assert list(frames.iterdir()) == []
+
+def test_partial_popen_failure_kills_started_segments(tmp_path, monkeypatch):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    started = []
+    real_popen = main.subprocess.Popen
+
+    def fake_popen(args, **kwargs):
+        if started:
+            raise OSError("fork failed")
+        p = real_popen(["sleep", "60"], **kwargs)
+        started.append(p)
+        return p
+
+    monkeypatch.setattr(main.subprocess, "Popen", fake_popen)
+    with pytest.raises(OSError):
+        main._produce_zip([["a"], ["b"]], str(frames), io.BytesIO(),
+                          main.threading.Event(), False)
+    # the segment that did start must not be left running as an orphan
+    assert started[0].poll() is not None
+
+def test_probe_cache_is_thread_safe(monkeypatch):
+    # segment building probes from worker threads; concurrent get/evict on
+    # the LRU used to be able to race a hit against another thread's evict
+    monkeypatch.setattr(main, "_fingerprint", lambda p: p)
+    monkeypatch.setattr(main, "_PROBE_CACHE", collections.OrderedDict())
+    monkeypatch.setattr(main, "_PROBE_CACHE_MAX", 4)
+    monkeypatch.setattr(
+        main.subprocess, "check_output",
+        lambda *a, **k: '{"streams": [{"codec_name": "h264"}]}')
+    errors = []
+
+    def worker(seed):
+        try:
+            for i in range(500):
+                main._probe_video_stream(f"v{(seed + i) % 8}.mp4")
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(main._PROBE_CACHE) <= 4
+
+def test_segments_single_for_open_ended_range():
+    assert len(main._ffmpeg_segments("in.mp4", "/tmp/f", 1, 0, 0)) == 1
+
+def test_segments_single_for_accurate_seek():
+    assert len(main._ffmpeg_segments("in.mp4", "/tmp/f", 1, 60, 600,
+                                     accurate_seek=True)) == 1
+
+def test_segments_split_and_number(monkeypatch):
+    monkeypatch.setattr(main.os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(main, "_MIN_SEGMENT_S", 5)
+    monkeypatch.setattr(main, "_probe_fps", lambda p: 25.0)
+    segs = main._ffmpeg_segments("in.mp4", "/tmp/f", 2, 0, 20)
+    assert len(segs) == 4
+    for args in segs:
+        assert args[args.index("-threads") + 1] == "1"
+    # -start_number blocks must hold a segment's worst-case frame count:
+    # ceil(5 s * 25 fps / K=50) = 3 kept frames per 5 s chunk
+    starts = [1] + [int(a[a.index("-start_number") + 1]) for a in segs[1:]]
+    spacing = {b - a for a, b in zip(starts, starts[1:])}
+    assert len(spacing) == 1
+    assert spacing.pop() >= 3
+
+def test_segments_block_fits_low_fps_keep_rate(monkeypatch):
+    # K = round(0.9 fps * 1 s) = 1 keeps every frame: 54 frames per 60 s
+    # chunk, not 60/every_s; the block must still fit them
+    monkeypatch.setattr(main.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(main, "_probe_fps", lambda p: 0.9)
+    segs = main._ffmpeg_segments("in.mp4", "/tmp/f", 1, 0, 120)
+    assert len(segs) == 2
+    block = int(segs[1][segs[1].index("-start_number") + 1]) - 1
+    assert block > 54
+
+def test_rejects_missing_and_conflicting_inputs(client):
+    assert client.post("/extract_frames").status_code == 422
+    r = client.post("/extract_frames",
+                    files={"file": ("x.mp4", b"x")},
+                    data={"video_url": "http://example.com/v.mp4"})
+    assert r.status_code == 422
+    r = client.post("/extract_frames", data={"video_url": "ftp://nope"})
+    assert r.status_code == 422
+
+def test_ffmpeg_failure_returns_500_not_empty_zip(client):
+    # garbage input: ffmpeg exits nonzero (or is absent entirely); either
+    # way the client must see an error, not a 200 with an empty archive
+    r = client.post("/extract_frames", files={"file": ("x.mp4", b"notavideo")})
+    assert r.status_code == 500
+    assert "ffmpeg failed" in r.json()["detail"]
+    r = client.post("/extract_frames", files={"file": ("x.mp4", b"notavideo")},
+                    data={"stream": "false"})
+    assert r.status_code == 500
+
+@pytest.mark.skipif(_FFMPEG is None, reason="ffmpeg not available")
+@pytest.mark.parametrize("fps", [None, 25.0], ids=["fps-fallback", "select"])
+def test_end_s_bounds_output(client, sample_video, monkeypatch, fps):
+    # both sampling paths must honor end_s: the select= variant once
+    # re-timed frames so -t overran the window by the keep factor
+    monkeypatch.setattr(main, "_probe_fps", lambda p: fps)
+    r = client.post("/extract_frames",
+                    files={"file": ("sample.mp4", sample_video.read_bytes())},
+                    data={"every_s": 1, "end_s": 5})
+    assert len(_zip_names(r)) == 5
+
+@pytest.mark.skipif(_FFMPEG is None, reason="ffmpeg not available")
+def test_accurate_seek_window(client, sample_video, monkeypatch):
+    monkeypatch.setattr(main, "_probe_fps", lambda p: 25.0)
+    r = client.post("/extract_frames",
+                    files={"file": ("sample.mp4", sample_video.read_bytes())},
+                    data={"every_s": 1, "start_s": 10, "end_s": 15,
+                          "accurate_seek": "true"})
+    assert len(_zip_names(r)) == 5
+
+@pytest.mark.skipif(_FFMPEG is None, reason="ffmpeg not available")
+def test_non_streaming_sends_content_length(client, sample_video):
+    r = client.post("/extract_frames",
+                    files={"file": ("sample.mp4", sample_video.read_bytes())},
+                    data={"every_s": 5, "stream": "false"})
+    assert "content-length" in r.headers
+    assert len(_zip_names(r)) > 0
+
+@pytest.mark.skipif(_FFMPEG is None, reason="ffmpeg not available")
+def test_parallel_segments_end_to_end(client, sample_video, monkeypatch):
+    monkeypatch.setattr(main.os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(main, "_MIN_SEGMENT_S", 5)
+    monkeypatch.setattr(main, "_probe_fps", lambda p: 25.0)
+    r = client.post(
+        "/extract_frames",
+        files={"file": ("sample.mp4", sample_video.read_bytes())},
+        data={"every_s": 2, "start_s": 0, "end_s": 20},
+    )
+    names = _zip_names(r)
+    # 4 segments x 3 frames each, no segment overwriting another's block
+    assert len(names) == 12
+    assert len(set(names)) == 12